@@ -0,0 +1,66 @@
+# cython: language_level=3
+"""
+Fused array-factor kernels for LinearArray.calc_AF_ and PlanarArray.calc_AF_
+
+Build in place with:  cythonize -3 -i _af_kernel.pyx
+"""
+
+cimport cython
+from libc.math cimport sin, cos, M_PI
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cpdef af_kernel(const double[::1] sin_theta, const double[::1] X, const double[::1] I, const double[::1] P, double complex[::1] out):
+    '''out[i] = sum_j I[j] * exp(1j * (P[j] + 2*pi*sin_theta[i]*X[j]))
+    evaluated in a single pass without (Nt, num_elem) temporaries'''
+    cdef Py_ssize_t Nt = sin_theta.shape[0]
+    cdef Py_ssize_t N = X.shape[0]
+    cdef Py_ssize_t i, j
+    cdef double s, phase, re, im
+
+    for i in range(Nt):
+        s = 2 * M_PI * sin_theta[i]
+        re = 0
+        im = 0
+        for j in range(N):
+            phase = P[j] + s * X[j]
+            re += I[j] * cos(phase)
+            im += I[j] * sin(phase)
+        out[i] = re + 1j * im
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cpdef planar_af_kernel(const double[::1] X, const double[::1] Y, const double[::1] Wr, const double[::1] Wi,
+                       const double[::1] U, const double[::1] V, Py_ssize_t k0,
+                       double complex[::1] out, double complex[::1] out_m):
+    '''out[k] = sum_e W[e] * exp(1j * 2*pi*(X[e]*U[k] + Y[e]*V[k])) with W = Wr + 1j*Wi
+    over flattened direction cosines U, V, and for k >= k0 out_m[k-k0], the sum at the
+    opposite direction (-U[k], -V[k]) from the same sin/cos; the element loop runs over
+    contiguous arrays with scalar accumulators, without (num_elem, Npt) temporaries'''
+    cdef Py_ssize_t Npt = U.shape[0]
+    cdef Py_ssize_t N = X.shape[0]
+    cdef Py_ssize_t k, e
+    cdef double u, v, phase, c, s, cr, ci, sr, si
+
+    for k in range(Npt):
+        u = 2 * M_PI * U[k]
+        v = 2 * M_PI * V[k]
+        cr = 0
+        ci = 0
+        sr = 0
+        si = 0
+        for e in range(N):
+            phase = u * X[e] + v * Y[e]
+            c = cos(phase)
+            s = sin(phase)
+            cr += Wr[e] * c
+            ci += Wi[e] * c
+            sr += Wr[e] * s
+            si += Wi[e] * s
+        out[k] = (cr - si) + 1j * (sr + ci)
+        if k >= k0:
+            out_m[k - k0] = (cr + si) + 1j * (ci - sr)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Numba JIT array-factor kernels, used by the array classes when numba is installed
+
+@author: mimfar
+"""
+
+import math
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def af_kernel(sin_theta, X, I, P):
+    '''AF[i] = sum_j I[j] * exp(1j * (P[j] + 2*pi*sin_theta[i]*X[j]))
+    fused trig + multiply-accumulate per theta, parallel over theta'''
+    Nt = sin_theta.shape[0]
+    N = X.shape[0]
+    out_r = np.empty(Nt)
+    out_i = np.empty(Nt)
+    for i in prange(Nt):
+        s = 2 * math.pi * sin_theta[i]
+        r = 0.0
+        im = 0.0
+        for j in range(N):
+            ph = P[j] + s * X[j]
+            r += I[j] * math.cos(ph)
+            im += I[j] * math.sin(ph)
+        out_r[i] = r
+        out_i[i] = im
+    return out_r + 1j * out_i
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def planar_af_kernel(X, Y, Wr, Wi, U, V, k0):
+    '''AF[k] = sum_e W[e] * exp(1j * 2*pi*(X[e]*U[k] + Y[e]*V[k])) with W = Wr + 1j*Wi
+    over flattened direction cosines U = cos(phi)sin(theta), V = sin(phi)sin(theta);
+    for k >= k0 also AFm[k-k0], the sum at the opposite direction (-U[k], -V[k]) from the
+    same sin/cos. Fused trig + multiply-accumulate per direction, parallel over directions'''
+    Npt = U.shape[0]
+    N = X.shape[0]
+    out_r = np.empty(Npt)
+    out_i = np.empty(Npt)
+    outm_r = np.empty(max(Npt - k0, 0))
+    outm_i = np.empty(max(Npt - k0, 0))
+    for k in prange(Npt):
+        u = 2 * math.pi * U[k]
+        v = 2 * math.pi * V[k]
+        cr = 0.0
+        ci = 0.0
+        sr = 0.0
+        si = 0.0
+        for e in range(N):
+            ph = u * X[e] + v * Y[e]
+            c = math.cos(ph)
+            s = math.sin(ph)
+            cr += Wr[e] * c
+            ci += Wi[e] * c
+            sr += Wr[e] * s
+            si += Wi[e] * s
+        out_r[k] = cr - si
+        out_i[k] = sr + ci
+        if k >= k0:
+            outm_r[k - k0] = cr + si
+            outm_i[k - k0] = ci - sr
+    return out_r + 1j * out_i, outm_r + 1j * outm_i
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, send_from_directory, make_response
+from flask import Flask, jsonify, request, send_from_directory, make_response, Response
 from flask_cors import CORS
 import random
 import io
@@ -6,11 +6,11 @@ import base64
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend to prevent threading issues
 import matplotlib.pyplot as plt
-from linear_array import LinearArray, db20
+from linear_array import LinearArray, db20, db20_inplace
 from planar_array import PlanarArray
 import numpy as np
+import orjson
 import hashlib
-import json
 import os
 from config import get_config
 from collections import OrderedDict
@@ -27,7 +27,7 @@ def log_cache_memory_status():
     app.logger.info(f"Cache status: {array_count} arrays")
     return array_count
 
-def generate_plot_image(fig):
+def generate_plot_image(fig, dpi=100):
     """Convert matplotlib figure to base64 encoded PNG image"""
     try:
         # Clear any existing plots to prevent state conflicts
@@ -35,7 +35,7 @@ def generate_plot_image(fig):
         
         # Save figure to bytes buffer
         img_buffer = io.BytesIO()
-        fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
+        fig.savefig(img_buffer, format='png', dpi=dpi, bbox_inches='tight')
         img_buffer.seek(0)
         
         # Convert to base64
@@ -54,6 +54,21 @@ def generate_plot_image(fig):
         import gc
         gc.collect()
 
+def warm_up_matplotlib():
+    """Render a throwaway figure so font cache and PNG code paths load at boot"""
+    fig = plt.figure()
+    try:
+        fig.text(0, 0, 'warm')
+        img_buffer = io.BytesIO()
+        fig.savefig(img_buffer, format='png')
+        img_buffer.close()
+    finally:
+        plt.close(fig)
+
+def fast_json(payload):
+    """Serialize a response with orjson, passing NumPy arrays through natively"""
+    return Response(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
+
 def create_error_response(message, status_code=400, error_type="validation_error"):
     """Create standardized error response"""
     return jsonify({
@@ -140,6 +155,13 @@ app.logger.info(f"Current log level: {app.logger.level}")
 app.logger.info(f"Log file: {config.LOG_FILE}")
 app.logger.info(f"Log level from config: {config.LOG_LEVEL}")
 
+# Warm up matplotlib so the first plot request doesn't pay the font-cache cost
+try:
+    warm_up_matplotlib()
+    app.logger.info("Matplotlib warm-up completed")
+except Exception as e:
+    app.logger.warning(f"Matplotlib warm-up failed: {e}")
+
 # Test file logging specifically
 try:
     app.logger.info("📝 Testing file logging...")
@@ -182,7 +204,7 @@ def test_memory():
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    print(f"Requested path: {path}")
+    app.logger.debug(f"Requested path: {path}")
     
     # Handle specific static files in root
     if path in ['favicon.ico', 'manifest.json', 'robots.txt', 'logo192.png', 'logo512.png', 'asset-manifest.json']:
@@ -216,6 +238,9 @@ def memory_status():
             },
             'cache': {
                 'array_count': cache_count,
+                'response_count': len(response_cache),
+                'response_bytes': response_cache_bytes,
+                'response_max_bytes': RESPONSE_CACHE_MAX_BYTES,
                 'max_size': ARRAY_CACHE_MAX_SIZE
             },
             'system_memory': {
@@ -238,6 +263,11 @@ CORS(app,
 # Global storage for array instances to avoid recalculation
 ARRAY_CACHE_MAX_SIZE = config.CACHE_MAX_SIZE
 array_cache = OrderedDict()
+# Serialized JSON responses keyed on the raw request body, bounded by total payload
+# bytes since a single 3D/contour response can be several MB (per gunicorn worker)
+RESPONSE_CACHE_MAX_BYTES = config.RESPONSE_CACHE_MAX_BYTES
+response_cache = OrderedDict()
+response_cache_bytes = 0
 
 def cache_array(key, arr):
     # If key already exists, move it to the end (most recently used)
@@ -309,11 +339,46 @@ def cache_array(key, arr):
         # Log cache status periodically
         log_cache_memory_status()
 
+def _canonical_params(value):
+    """Convert nested dicts/lists into sorted tuples so equal params hash equally"""
+    if isinstance(value, dict):
+        return tuple((k, _canonical_params(value[k])) for k in sorted(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical_params(v) for v in value)
+    return value
+
+def cache_response(key, payload):
+    """Store serialized response bytes, evicting least recently used entries until both the
+    entry count and the total size (RESPONSE_CACHE_MAX_BYTES) are within bounds; payloads
+    larger than the whole byte budget are not cached"""
+    global response_cache_bytes
+    if len(payload) > RESPONSE_CACHE_MAX_BYTES:
+        app.logger.debug(f"Response of {len(payload)} bytes exceeds the response cache budget, not cached")
+        return
+    if key in response_cache:
+        response_cache_bytes -= len(response_cache.pop(key))
+    response_cache[key] = payload
+    response_cache_bytes += len(payload)
+    while len(response_cache) > ARRAY_CACHE_MAX_SIZE or response_cache_bytes > RESPONSE_CACHE_MAX_BYTES:
+        _, evicted = response_cache.popitem(last=False)
+        response_cache_bytes -= len(evicted)
+
+def clear_response_cache():
+    """Drop all cached responses"""
+    global response_cache_bytes
+    response_cache.clear()
+    response_cache_bytes = 0
+
+def get_response_key(body):
+    """Generate a cache key from the raw request body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
 def get_array_key(array_type, array_params):
     """Generate a unique key for array caching"""
-    # Create a hash of the array parameters
-    param_str = json.dumps(array_params, sort_keys=True)
-    return f"{array_type}_{hashlib.md5(param_str.encode()).hexdigest()}"
+    # Hash a canonical tuple of the parameters (avoids building a JSON string)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(_canonical_params(array_params)).encode())
+    return f"{array_type}_{h.hexdigest()}"
 
 def cleanup_array_objects():
     """Clean up NumPy arrays from all cached objects"""
@@ -340,6 +405,7 @@ def cleanup_array_objects():
             del arr.I
         if hasattr(arr, 'P'):
             del arr.P
+    clear_response_cache()
     
     # Force garbage collection
     gc.collect()
@@ -411,17 +477,15 @@ def create_plot_response(plot_type, arr, grid_x, grid_y, pattern_params, pattern
         # 2D pattern cut
         theta_deg, G = arr.pattern_cut(cut_angle)
         G[G<-100] = -100
-        theta = theta_deg.tolist()
-        pattern = G.tolist()
         
         # Add y-axis limits
-        ymax = 5 * (int(max(pattern) / 5) + 1)
+        ymax = 5 * (int(G.max() / 5) + 1)
         ymin = ymax - 40
         
         return {
             **base_response,
-            'theta': theta,
-            'pattern': pattern,
+            'theta': theta_deg,
+            'pattern': G,
             'cut_angle': cut_angle,
             'ymin': ymin,
             'ymax': ymax
@@ -484,6 +548,15 @@ def ratelimit_handler(e):
         "message": "You have exceeded the allowed number of requests. Please try again later."
     }), 429
 
+@app.before_request
+def reject_oversized_api_requests():
+    """Reject oversized API bodies from the Content-Length header, before parsing"""
+    if request.path.startswith('/api/') and request.content_length and request.content_length > config.API_MAX_CONTENT_LENGTH:
+        app.logger.warning(f"Rejected API request with Content-Length {request.content_length}")
+        return create_error_response(
+            f'Request body exceeds the {config.API_MAX_CONTENT_LENGTH} byte limit',
+            413, 'payload_too_large')
+
 @app.route('/api/linear-array/analyze', methods=['POST'])
 @limiter.limit(config.RATE_LIMIT_LINEAR)
 def analyze_linear_array():
@@ -576,24 +649,23 @@ def analyze_linear_array():
     app.logger.info(f'Largest Matrix: {arr.num_elem * arr.AF.nbytes / (1024 * 1024):1.1f} MB')
 
     # Calculate pattern data (same for both cartesian and polar plots)
-    theta = arr.theta.tolist()
-    pattern = db20(arr.AF)
+    theta = arr.theta
+    pattern = db20_inplace(arr.AF)
     pattern[pattern<-100] = -100    
-    pattern = pattern.tolist()
-    grid = arr.X.ravel().tolist() if show_grid else None
+    grid = arr.X if show_grid else None
     
 
     
     # Calculate y-axis limits
-    ymax = 5 * (int(max(pattern) / 5) + 1)
+    ymax = 5 * (int(pattern.max() / 5) + 1)
     ymin = ymax - 40
 
     response = {
         'theta': theta,
         'pattern': pattern,
         'grid': grid,
-        'phase':((np.rad2deg(arr.P.ravel()) + 180) % 360 -180).tolist(),
-        'amplitude':db20(arr.I.ravel()).tolist(),
+        'phase':(np.rad2deg(arr.P) + 180) % 360 -180,
+        'amplitude':db20(arr.I),
         'gain': pattern_params.Gain,
         'peak_angle': pattern_params.Peak_Angle,
         'sll': pattern_params.SLL,
@@ -602,12 +674,19 @@ def analyze_linear_array():
         'ymax': ymax
     }
     app.logger.info(f"Linear array analysis successful for num_elem={num_elem}, element_spacing={element_spacing}")
-    return jsonify(response)
+    return fast_json(response)
 
 @app.route('/api/planar-array/analyze', methods=['POST'])
 @limiter.limit(config.RATE_LIMIT_PLANAR)
 def analyze_planar_array():
     app.logger.info("/api/planar-array/analyze called")
+    # Identical request bodies produce identical responses
+    body_key = get_response_key(request.get_data())
+    if body_key in response_cache:
+        response_cache.move_to_end(body_key)
+        app.logger.info(f"Using cached planar response for key: {body_key[:20]}...")
+        return app.response_class(response_cache[body_key], mimetype='application/json')
+
     # Input validation
     data = request.get_json()
     if not data:
@@ -717,7 +796,7 @@ def analyze_planar_array():
     if array_key in array_cache:
         # Use cached array
         arr = array_cache[array_key]
-        print(f"Using cached array for key: {array_key}")
+        app.logger.debug(f"Using cached array for key: {array_key}")
         
         # Using cached planar array (memory logging simplified)
     else:
@@ -740,14 +819,14 @@ def analyze_planar_array():
         
         # Cache the array instance for future use
         cache_array(array_key, arr)
-        print(f"Created and cached new array for key: {array_key}")
+        app.logger.debug(f"Created and cached new array for key: {array_key}")
 
     app.logger.info(f'AF size: {arr.AF.nbytes / (1024 * 1024):1.1f} MB')
     app.logger.info(f'AF shape: {arr.AF.shape}')
 
     # Get grid data
-    grid_x = (arr.X - np.mean(arr.X)).tolist()
-    grid_y = (arr.Y - np.mean(arr.Y)).tolist()
+    grid_x = arr.X - np.mean(arr.X)
+    grid_y = arr.Y - np.mean(arr.Y)
     
     pattern_params = arr.calc_peak_sll_hpbw(cut_angle)
     pattern_params_3d = arr.calc_peak_sll_hpbw(scan_angle[1])
@@ -758,7 +837,9 @@ def analyze_planar_array():
     # Generate response based on plot type
     response = create_plot_response(plot_type, arr, grid_x, grid_y, pattern_params,pattern_params_3d, cut_angle)
     app.logger.info(f"Planar array analysis successful for array_type={array_type}, num_elem={num_elem}")
-    return jsonify(response)
+    json_response = fast_json(response)
+    cache_response(body_key, json_response.get_data())
+    return json_response
 
 # Generate a secure nonce for CSP
 def generate_nonce():
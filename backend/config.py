@@ -17,10 +17,12 @@ class Config:
     
     # API Configuration
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB default
+    API_MAX_CONTENT_LENGTH = int(os.environ.get('API_MAX_CONTENT_LENGTH', 64 * 1024))  # 64KB default for /api/ requests
     
     # Cache Configuration
     CACHE_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT', 3600))  # 1 hour default
     CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', 100))  # 100 items default
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64MB default per worker
     
     # Security Configuration
     MAX_ELEMENTS = int(os.environ.get('MAX_ELEMENTS', 1000))  # Maximum array elements
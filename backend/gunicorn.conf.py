@@ -1,11 +1,32 @@
 # Gunicorn configuration file for production deployment
 
+import multiprocessing
+import os
+
 # Server socket
 bind = "0.0.0.0:5001"
 backlog = 2048
 
 # Worker processes
-workers = 2
+# Preloading imports numpy/matplotlib and the array modules once in the master,
+# so forked workers share those pages copy-on-write. array_cache still diverges
+# per worker after the fork.
+preload_app = True
+# The AF computations are CPU bound, so default to one worker per usable core (the
+# affinity mask respects container cpusets, cpu_count() reports the host's cores).
+# Override with WEB_CONCURRENCY or GUNICORN_WORKERS.
+try:
+    _cpus = len(os.sched_getaffinity(0))
+except AttributeError:
+    _cpus = multiprocessing.cpu_count()
+workers = int(os.environ.get('WEB_CONCURRENCY') or os.environ.get('GUNICORN_WORKERS') or _cpus)
+
+# One compute thread per worker so numexpr / BLAS / numba don't oversubscribe the cores
+# the workers already fill. Set here, before preload_app imports numpy, so the libraries
+# pick them up; explicit environment values win.
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+             'NUMEXPR_NUM_THREADS', 'NUMEXPR_MAX_THREADS', 'NUMBA_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
 worker_class = "sync"
 worker_connections = 1000
 timeout = 180
@@ -6,23 +6,119 @@ Created on Mon Oct 10 23:21:26 2022
 @author: mimfar
 """
 
+import math
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 from scipy.signal.windows import get_window, taylor, chebwin
 
 from collections.abc import Iterable
 from collections import namedtuple
-from functools import partial
-import matplotlib
+from functools import partial, lru_cache
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+try:
+    # Optional compiled kernel, built with: cythonize -3 -i _af_kernel.pyx
+    from _af_kernel import af_kernel
+except ImportError:
+    af_kernel = None
+try:
+    # Optional JIT kernel, parallel over theta; used when numba is installed
+    from _af_numba import af_kernel as af_kernel_jit
+except ImportError:
+    af_kernel_jit = None
 PI = np.pi
 
+# Fused float64 AF kernel compiled_af(sin_theta, X, I, P) -> AF, or None if neither
+# the numba nor the Cython kernel is available
+if af_kernel_jit is not None:
+    compiled_af = af_kernel_jit
+elif af_kernel is not None:
+    def compiled_af(sin_theta, X, I, P):
+        AF = np.empty(len(sin_theta), dtype=complex)
+        af_kernel(sin_theta, X, I, P, AF)
+        return AF
+else:
+    compiled_af = None
+
 def db(m,x):
     return m * np.log10(np.abs(x))
 
 db10 = partial(db,10)
 db20 = partial(db,20)
+
+def db_inplace(m,x,out=None):
+    '''m*log10(|x|) evaluated in a single buffer: |x| is written to out (when it
+    matches x's shape, else a new array) and log10 and the scaling run in place'''
+    out = np.abs(x, out=out if out is not None and out.shape == np.shape(x) else None)
+    np.log10(out, out=out)
+    out *= m
+    return out
+
+db10_inplace = partial(db_inplace,10)
+db20_inplace = partial(db_inplace,20)
+
+@lru_cache(maxsize=32)
+def window_vec(num_elem, window, SLL):
+    '''Element excitation (taper) for the given window / SLL, used by LinearArray
+    and for PlanarArray's row / column tapers. Cached because the same taper is
+    reused on every calc_AF call (e.g. across calc_envelope scans). SLL takes
+    precedence over window. The returned array is read-only since it is shared
+    between callers.'''
+    if SLL:
+        if SLL < 50:
+            I = taylor(num_elem, nbar=5, sll=SLL)
+        else:
+            I = chebwin(num_elem, SLL)
+    elif window:
+        I = get_window(window, num_elem)
+    else:
+        I = np.ones(num_elem)
+    I.setflags(write=False)
+    return I
+
+# Upper bound on the (scans, Nt, num_elem) scratch buffers of _af_sum, in elements
+_AF_BLOCK_ELEMS = 2**21
+
+def _af_sum(sin_theta, X, I, P, dtype=np.float64):
+    '''Un-normalized AF for each row of the element phases P (Nscan, num_elem),
+    returned as (Nscan, Nt), over the theta grid given by its sine. 2*pi*sin(theta)*X
+    is built once; the scans are then processed in blocks so the scratch buffers stay
+    bounded by _AF_BLOCK_ELEMS'''
+    Nt, N = len(sin_theta), len(X)
+    if compiled_af is not None and dtype == np.float64:
+        # convert everything once (rows of a C-contiguous P are contiguous) and bind
+        # the kernel locally, so the per-scan loop is a bare call
+        sin_theta, X, I, P = (np.ascontiguousarray(a, dtype=np.float64) for a in (sin_theta, X, I, P))
+        kernel = compiled_af
+        return np.array([kernel(sin_theta, X, I, p) for p in P])
+
+    AF = np.empty((len(P), Nt), dtype=np.result_type(dtype, np.complex64))
+    B = ((2 * PI * np.asarray(sin_theta)).reshape(-1,1) * X).astype(dtype)
+    I = I.astype(dtype, copy=False)
+    P = P.astype(dtype, copy=False)
+    nb = min(len(P), max(1, _AF_BLOCK_ELEMS // (Nt * N)))
+    # phase buffer and trig buffer (numexpr writes the trig straight into the first);
+    # block slices of it stay C-contiguous, which NumPy's SIMD sin/cos loops require
+    work = np.empty((1 if ne is not None else 2, nb, Nt, N), dtype=dtype)
+    cos, sin, evaluate = np.cos, np.sin, ne.evaluate if ne is not None else None
+    for k in range(0, len(P), nb):
+        Pk = P[k:k+nb].reshape(-1,1,N)
+        phase = work[0,:len(Pk)]
+        if evaluate is not None:
+            # numexpr evaluates phase + trig block-wise (threaded, in cache)
+            operands = {'B': B, 'P': Pk}
+            re = evaluate('cos(B + P)', local_dict=operands, out=phase).reshape(-1,N) @ I
+            im = evaluate('sin(B + P)', local_dict=operands, out=phase).reshape(-1,N) @ I
+        else:
+            # phase[k,i,j] = P[k,j] + 2*pi*sin(theta[i])*X[j], built in place; the element
+            # sum is two real BLAS mat-vecs, no complex (scans,Nt,N) array is materialized
+            np.add(B, Pk, out=phase)
+            re = cos(phase, out=work[1,:len(Pk)]).reshape(-1,N) @ I
+            im = sin(phase, out=phase).reshape(-1,N) @ I
+        AF[k:k+nb].real = re.reshape(-1,Nt)
+        AF[k:k+nb].imag = im.reshape(-1,Nt)
+    return AF
     
 
 class LinearArray():
@@ -30,7 +126,7 @@ class LinearArray():
     
     Version = '0.1'
     
-    def __init__(self,num_elem,element_spacing,scan_angle=0,theta=[],element_pattern=True,window=None,SLL=None,element_gain=0):
+    def __init__(self,num_elem,element_spacing,scan_angle=0,theta=[],element_pattern=True,window=None,SLL=None,element_gain=0,dtype=np.float64):
         
         '''AF_calc calculates the Array Factor (AF) of a linear antenna array with 
         uniform antenna element spacing 
@@ -39,6 +135,8 @@ class LinearArray():
         scan_angle (deg): A progressive phase shift will be applied to array elements to scan the beam to scan angle
         theta (deg)     : spatial angle range -90:90 with braodside=0
         element_pattern :Applies cosine envelope on top of the array factor
+        dtype           : float type of the AF phase/trig arithmetic; np.float32 halves the
+                          memory traffic at the cost of ~1e-3 rad phase error on long arrays
         The Gain is calculated for the array factor only not array factor x element pattern '''
         
         assert num_elem > 0 , ('num_elem must be > 0  ')
@@ -57,205 +155,176 @@ class LinearArray():
         self.X = self.X - np.mean(self.X)
         self.scan_angle = scan_angle
         self.theta = theta
+        # an explicit theta grid is used as given (even one containing 0.0); otherwise
+        # calc_AF builds the default grid on first use
+        self._theta_provided = bool(len(theta)) if hasattr(theta,'__len__') else theta is not None
         self.element_pattern = element_pattern
         self.window = window
         self.SLL = SLL
         self.element_gain = element_gain
+        self.dtype = np.dtype(dtype)
         
     @classmethod
     def from_element_position(cls,X,**kwargs):
         return cls(len(X),np.diff(sorted(X)),**kwargs)
+
+    @property
+    def X(self):
+        return self._X
+
+    @X.setter
+    def X(self, X):
+        # element phase per unit sin(scan_angle), kept in step with every reassignment of X
+        self._X = X
+        self._minus2piX = -2 * PI * X
+
+    @X.deleter
+    def X(self):
+        del self._X, self._minus2piX
         
     @property
     def calc_AF(self):
         
+        self.P = self._minus2piX * math.sin(math.radians(self.scan_angle))
+        self._set_taper()
+        self._set_theta()
+        self.AF = self.calc_AF_()
+        return self.AF  
 
-        array_length = max(self.X) - min(self.X)
-        self.P = -2 * PI * self.X * np.sin(np.radians(self.scan_angle)) 
-        self.I = np.ones(self.X.shape)
+    def _set_taper(self):
+        '''Element excitations I for the current window / SLL'''
+        window = tuple(self.window) if isinstance(self.window, list) else self.window
+        self.I = window_vec(self.num_elem, window, self.SLL)
 
-        if self.window:
-            self.I = get_window(self.window, self.num_elem)
-        if self.SLL:
-            if self.SLL < 50:
-                self.I = taylor(self.num_elem, nbar=5, sll=self.SLL)
-            else:
-                self.I = chebwin(self.num_elem, self.SLL)
-        
- 
-                
-        if not any(self.theta):
+    def _set_theta(self):
+        '''Theta grid (the default one unless theta was given) and its trig, shared by the
+        AF sum, the normalization and calc_envelope'''
+        if not self._theta_provided:
+            array_length = max(self.X) - min(self.X)
             HPBW = 51 / array_length
             Nt = int(180 / (HPBW / 4))
             if Nt % 2 == 0:
                 Nt = Nt + 1
             Nt = max(Nt,181) # 181 point is at least 1 degree theta resolution
             self.theta = np.linspace(-90,90,Nt)
-            self.AF = self.calc_AF_()          
-        else:
-            self.AF = self.calc_AF_()
-        return self.AF  
+            self._theta_provided = True
+        self._theta_rad = np.radians(self.theta)
+        self._sin_theta = np.sin(self._theta_rad)
+        self._cos_theta = np.cos(self._theta_rad) # == sin(theta + 90deg)
         
     def calc_AF_(self):
-        
-        self.X = self.X.reshape(1,-1)
-        theta = self.theta.reshape(-1,1)
-        self.P = self.P.reshape(1,-1)
-        self.I = self.I.reshape(1,-1)
-        AF = np.sum(self.I * np.exp(1j * self.P + 1j * 2 * np.pi 
-                      * np.dot (np.sin(np.radians(theta)),self.X)),axis = 1).reshape(theta.shape)
-          
-        delta_theta = (theta[1] - theta[0]) * np.pi / 180
-        AF_int = 0.5 * np.sum(np.abs(AF)**2 * np.sin(np.radians(theta + 90))) * delta_theta  # integral of AF^2
-        AF = AF/ (AF_int ** 0.5)
+        return self._normalize_AF(self._sum_AF(self.P))
+
+    def _sum_AF(self, P):
+        '''Un-normalized array factor sum_j I[j]*exp(1j*(P[j] + 2*pi*sin(theta)*X[j]))'''
+        return _af_sum(self._sin_theta, self.X, self.I, P.reshape(1,-1), self.dtype)[0]
+
+    @staticmethod
+    def calc_AF_batch(X, scan_angles, theta, I=None, dtype=np.float64, sin_theta=None):
+        '''Un-normalized AF of the element positions X for every scan angle in one
+        call, shape (len(scan_angles), len(theta)); the 2*pi*sin(theta)*X term and the
+        taper I (uniform if None) are shared by all scans. Angles in degrees.
+        sin_theta: sin of the theta grid, when the caller already has it'''
+        X = np.asarray(X, dtype=np.float64)
+        I = np.ones(len(X)) if I is None else I
+        P = -2 * PI * np.sin(np.radians(scan_angles)).reshape(-1,1) * X
+        sin_theta = np.sin(np.radians(theta)) if sin_theta is None else sin_theta
+        return _af_sum(sin_theta, X, I, P, dtype)
+
+    def _normalize_AF(self, AF):
+        '''Normalizes AF to unit radiated power and applies the element pattern'''
+        delta_theta = self._theta_rad[1] - self._theta_rad[0]
+        # integral of AF^2 as a dot product with cos(theta), one per pattern along the
+        # last axis (calc_envelope normalizes a batch)
+        AF2 = np.abs(AF).astype(np.float64, copy=False)
+        AF2 *= AF2
+        AF_int = 0.5 * (AF2 @ self._cos_theta) * delta_theta
+        AF = AF/ np.sqrt(AF_int)[...,None]
         
         if self.element_pattern:
-            AF = AF * np.cos(np.radians(theta)) ** 0.3
+            AF = AF * self._cos_theta ** 0.3
             if self.element_gain:
                 AF = AF * 10**(self.element_gain/20)
         
-        return AF.ravel()
+        return AF
 
     def calc_peak_sll_hpbw(self):
         '''Function calculates the Peak value and angle, SLL, and HPBW of G in dB
         assuming a pattern with a single peak (no grating lobes)'''
-        G,theta_deg = np.ravel(db20(self.AF)),np.ravel(self.theta)
+        G,theta_deg = db20_inplace(self.AF),np.ravel(self.theta)
         peak,idx_peak  = np.max(G), np.argmax(G) 
         theta_peak = theta_deg[idx_peak]
         dG = np.sign(np.diff(G))
-        dG_cs = -dG[0:-1] * dG[1:]# change sign in derivative (peaks & nulls)
-        dG_cs = np.insert(np.append(dG_cs,1),0,1) 
-        cs_idx = np.asarray(dG_cs == 1).nonzero()[0] # idx of peaks and nulls
-        idx_ = np.asarray(cs_idx == idx_peak).nonzero()[0][0]
-        idx_null_L, idx_null_R= cs_idx[idx_-1],cs_idx[idx_+1]
-        try:
-            idx_3dB_R = idx_peak + np.argmin(np.abs(G[idx_peak:idx_null_R] - peak + 3))
-            idx_3dB_L = idx_null_L + np.argmin(np.abs(G[idx_null_L:idx_peak] - peak + 3))
-            HPBW = theta_deg[idx_3dB_R] - theta_deg[idx_3dB_L]    
-        except:
+        cs = np.zeros(G.size, dtype=bool) # change sign in derivative (peaks & nulls)
+        cs[1:-1] = dG[:-1] * dG[1:] < 0
+        cs[[0,-1]] = True
+        cs_idx = np.flatnonzero(cs) # idx of peaks and nulls
+        idx_null_L = cs_idx[max(np.searchsorted(cs_idx, idx_peak, side='left') - 1, 0)]
+        idx_null_R = cs_idx[min(np.searchsorted(cs_idx, idx_peak, side='right'), cs_idx.size - 1)]
+
+        # -3dB points, linearly interpolated between the samples bracketing the crossing
+        # (floored so an exact null at -inf dB doesn't turn the interpolation into nan)
+        d = np.maximum(G, peak - 300) - (peak - 3)
+        below_R = np.flatnonzero(d[idx_peak:idx_null_R + 1] < 0)
+        below_L = np.flatnonzero(d[idx_null_L:idx_peak] < 0)
+        if idx_null_L < idx_peak < idx_null_R:
+            if below_R.size:
+                k = idx_peak + below_R[0] - 1
+                theta_3dB_R = theta_deg[k] + d[k] / (d[k] - d[k+1]) * (theta_deg[k+1] - theta_deg[k])
+            else:
+                theta_3dB_R = theta_deg[idx_null_R]
+            if below_L.size:
+                k = idx_null_L + below_L[-1]
+                theta_3dB_L = theta_deg[k] + d[k] / (d[k] - d[k+1]) * (theta_deg[k+1] - theta_deg[k])
+            else:
+                theta_3dB_L = theta_deg[idx_null_L]
+            HPBW = theta_3dB_R - theta_3dB_L
+        else:
             HPBW = 0
-        try:
-            SLL = peak - np.max([np.max(G[0:idx_null_L]),np.max(G[idx_null_R:])])
-        except:
-            SLL = 100
+        # side lobes lie strictly outside the main-beam nulls; a side whose only sample
+        # beyond the peak is the null / edge sample itself has no lobe
+        side_lobes = np.concatenate((G[:idx_null_L], G[idx_null_R+1:]))
+        SLL = peak - side_lobes.max() if side_lobes.size else 100
         pattern_params = namedtuple('pattern_params',['Gain','Peak_Angle','SLL','HPBW'])
         self.pattern_params = pattern_params(peak, theta_peak, SLL, HPBW)
         return self.pattern_params
     
     @staticmethod
-    def _plot(x,y,fig=None,ax=None,marker = '-',xlim = None, ylim = None, xlab = r'$\theta$',ylab = 'dBi',title = ''):
-        
-        if isinstance(fig, matplotlib.figure.Figure) and (not isinstance(ax,matplotlib.axes.Axes)):
-            if fig.axes:
-                ax = fig.axes[0]
-            else:
-                ax = fig.add_axes([0.1,0.1,0.9,0.9]);
-        elif not isinstance(fig, matplotlib.figure.Figure):
-            if isinstance(ax,matplotlib.axes.Axes):
-                fig = ax.get_figure();
-            else:
-                fig, ax = plt.subplots(figsize=(8,6))
-    
-
-        ax.plot(x,y,marker)
-        ax.set_xlabel(xlab)
-        ax.set_ylabel(ylab)
-        ax.set_title(title)
-        
-        peak_plot = 5 * (int(np.max(y) / 5) + 1)
-
-        if not xlim:
-           xlim = (np.min(x),np.max(x))
-        if not ylim:
-            ylim = ((peak_plot-30,peak_plot))
-        
-        ax.set_xlim(xlim)
-        ax.set_ylim(ylim)
-        ax.grid(True)
-        return  fig, ax
+    def _plot(*args,**kwargs):
+        from linear_array_plot import _plot
+        return _plot(*args,**kwargs)
 
     @staticmethod
-    def _polar(t,r,fig=None,ax=None,marker = '-',tlim = None, rlim = None ,title=''):
-        
-        if isinstance(fig, matplotlib.figure.Figure) and (not isinstance(ax,matplotlib.axes.Axes)):
-            if fig.axes:
-                ax = fig.axes[0]
-            else:
-                ax = fig.add_axes([0.1,0.1,0.9,0.9],polar=True)
-        elif not isinstance(fig, matplotlib.figure.Figure):
-            if isinstance(ax,matplotlib.axes.Axes):
-                fig = ax.get_figure()
-            else:
-                fig, ax = plt.subplots(figsize=(8,6),subplot_kw={'projection': 'polar'})
-        
-        # if not isinstance(fig, matplotlib.figure.Figure):
-        #     fig, ax = plt.subplots(figsize=(8,6),subplot_kw={'projection': 'polar'})
-        # else:
-        #     ax = fig.add_axes([0, 0, 1.6, 1.2], polar=True)
-        
-        peak_plot = 5 * (int(np.max(r) / 5) + 1)
-  
-        ax.plot(np.radians(t), r)
-        ax.set_thetagrids(angles=np.linspace(-90,90,13))
-        if tlim:
-            ax.set_thetamin(tlim[0])
-            ax.set_thetamax(tlim[1])
-        else:
-            ax.set_thetamin(-90)
-            ax.set_thetamax(90)
-                
-        if rlim:
-            ax.set_rmax(rlim[1])
-            ax.set_rmin(rlim[0])
-        else:
-            ax.set_rmax(peak_plot)
-            ax.set_rmin(peak_plot-30)
-
-        ax.grid(True)
-        ax.set_theta_zero_location("N")
-        ax.set_rlabel_position(180)  # Move radial labels away from plotted line
-        ax.set_theta_direction('clockwise')
-            
-        return fig,ax
+    def _polar(*args,**kwargs):
+        from linear_array_plot import _polar
+        return _polar(*args,**kwargs)
         
     def plot_pattern(self,annotate=False,**kwargs):
-        fig,ax = self._plot(self.theta,db20(self.AF),**kwargs)
-        if annotate:
-            peak,t_peak,sll,hpbw = self.calc_peak_sll_hpbw()
-            ax.plot(t_peak,peak,'o')
-            ax.text(t_peak,peak,f'peak={peak:1.1f}dB @{t_peak:1.1f}deg',va='center')
-            ax.arrow(t_peak-hpbw/2, peak-3, hpbw, 0 , linewidth=0.5,color='black',length_includes_head=True,width=.25)
-            ax.text(t_peak+hpbw/2,peak-3,f'HPBW={hpbw:1.1f}deg',va='center')
-            ax.plot([t_peak-2 * hpbw,t_peak],[peak,peak],'--k',linewidth=0.5)
-            ax.plot([t_peak-2 * hpbw,t_peak+ 2 * hpbw],[peak-sll,peak-sll],'--k',linewidth=0.5)
-            ax.arrow(t_peak-2*hpbw, peak, 0, -sll , linewidth=0.5,color='black',length_includes_head=True,width=.5)
-            ax.text(t_peak-2*hpbw,peak-sll/2,f'SLL={sll:1.1f}dB',ha='right')
-        return fig,ax
+        from linear_array_plot import plot_pattern
+        return plot_pattern(self,annotate=annotate,**kwargs)
         
     def plot_envelope(self,plot_all=True,**kwargs):
-        if plot_all:    
-            return self._plot(self.theta,self.envelopes,**kwargs)
-        else:
-            return self._plot(self.theta,self.envelopes[:,-1 ],**kwargs)
+        from linear_array_plot import plot_envelope
+        return plot_envelope(self,plot_all=plot_all,**kwargs)
 
     def polar_pattern(self,**kwargs):
-        return self._polar(self.theta,db20(self.AF),**kwargs)  
+        from linear_array_plot import polar_pattern
+        return polar_pattern(self,**kwargs)
     
     def polar_envelope(self,plot_all=True,**kwargs):
-        if plot_all:    
-            return self._polar(self.theta,self.envelopes,**kwargs)
-        else:
-            return self._polar(self.theta,self.envelopes[:,-1 ],**kwargs)
+        from linear_array_plot import polar_envelope
+        return polar_envelope(self,plot_all=plot_all,**kwargs)
        
     def calc_envelope(self,theta1=0,theta2=45,delta_theta=5):
         N = int((theta2 - theta1)/delta_theta)
         self.scan_range = np.linspace(theta1,theta2,N+1)
-        scan_angle_ = self.scan_angle
-        self.envelopes = np.zeros((N+1,len(self.theta)))
-        for idx,scan_angle in enumerate(self.scan_range):
-            self.scan_angle = scan_angle
-            self.envelopes[idx,:] = db20(self.calc_AF.ravel())
-        self.envelopes[N,:] = np.max(self.envelopes[:-1,:],axis=0)
-        self.envelopes = self.envelopes.T
-        self.scan_angle = scan_angle_
+        self._set_taper()
+        self._set_theta()
+        # all scans in one batched AF call; its (scans, Nt) C-order result transposes
+        # straight into the (Nt, N+1) Fortran-order envelopes. The last column holds
+        # the max envelope, so the last scan angle's pattern is never needed
+        AF = self.calc_AF_batch(self.X, self.scan_range[:-1], self.theta, self.I, self.dtype, self._sin_theta)
+        self.envelopes = np.empty((len(self.theta),N+1), dtype=np.float64, order='F')
+        db20_inplace(self._normalize_AF(AF).T, out=self.envelopes[:,:-1])
+        np.max(self.envelopes[:,:-1],axis=1,out=self.envelopes[:,-1])
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matplotlib plotting for LinearArray, kept out of linear_array so the numerics
+import without paying for matplotlib
+
+@author: mimfar
+"""
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from linear_array import db20_inplace
+
+
+def _plot(x,y,fig=None,ax=None,marker = '-',xlim = None, ylim = None, xlab = r'$\theta$',ylab = 'dBi',title = ''):
+
+    if isinstance(fig, matplotlib.figure.Figure) and (not isinstance(ax,matplotlib.axes.Axes)):
+        if fig.axes:
+            ax = fig.axes[0]
+        else:
+            ax = fig.add_axes([0.1,0.1,0.9,0.9]);
+    elif not isinstance(fig, matplotlib.figure.Figure):
+        if isinstance(ax,matplotlib.axes.Axes):
+            fig = ax.get_figure();
+        else:
+            fig, ax = plt.subplots(figsize=(8,6))
+
+
+    ax.plot(x,y,marker)
+    ax.set_xlabel(xlab)
+    ax.set_ylabel(ylab)
+    ax.set_title(title)
+
+    peak_plot = 5 * (int(np.max(y) / 5) + 1)
+
+    if not xlim:
+       xlim = (np.min(x),np.max(x))
+    if not ylim:
+        ylim = ((peak_plot-30,peak_plot))
+
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    ax.grid(True)
+    return  fig, ax
+
+def _polar(t,r,fig=None,ax=None,marker = '-',tlim = None, rlim = None ,title=''):
+
+    if isinstance(fig, matplotlib.figure.Figure) and (not isinstance(ax,matplotlib.axes.Axes)):
+        if fig.axes:
+            ax = fig.axes[0]
+        else:
+            ax = fig.add_axes([0.1,0.1,0.9,0.9],polar=True)
+    elif not isinstance(fig, matplotlib.figure.Figure):
+        if isinstance(ax,matplotlib.axes.Axes):
+            fig = ax.get_figure()
+        else:
+            fig, ax = plt.subplots(figsize=(8,6),subplot_kw={'projection': 'polar'})
+
+    # if not isinstance(fig, matplotlib.figure.Figure):
+    #     fig, ax = plt.subplots(figsize=(8,6),subplot_kw={'projection': 'polar'})
+    # else:
+    #     ax = fig.add_axes([0, 0, 1.6, 1.2], polar=True)
+
+    peak_plot = 5 * (int(np.max(r) / 5) + 1)
+
+    ax.plot(np.radians(t), r)
+    ax.set_thetagrids(angles=np.linspace(-90,90,13))
+    if tlim:
+        ax.set_thetamin(tlim[0])
+        ax.set_thetamax(tlim[1])
+    else:
+        ax.set_thetamin(-90)
+        ax.set_thetamax(90)
+
+    if rlim:
+        ax.set_rmax(rlim[1])
+        ax.set_rmin(rlim[0])
+    else:
+        ax.set_rmax(peak_plot)
+        ax.set_rmin(peak_plot-30)
+
+    ax.grid(True)
+    ax.set_theta_zero_location("N")
+    ax.set_rlabel_position(180)  # Move radial labels away from plotted line
+    ax.set_theta_direction('clockwise')
+
+    return fig,ax
+
+def plot_pattern(arr,annotate=False,**kwargs):
+    fig,ax = _plot(arr.theta,db20_inplace(arr.AF),**kwargs)
+    if annotate:
+        peak,t_peak,sll,hpbw = arr.calc_peak_sll_hpbw()
+        ax.plot(t_peak,peak,'o')
+        ax.text(t_peak,peak,f'peak={peak:1.1f}dB @{t_peak:1.1f}deg',va='center')
+        ax.arrow(t_peak-hpbw/2, peak-3, hpbw, 0 , linewidth=0.5,color='black',length_includes_head=True,width=.25)
+        ax.text(t_peak+hpbw/2,peak-3,f'HPBW={hpbw:1.1f}deg',va='center')
+        ax.plot([t_peak-2 * hpbw,t_peak],[peak,peak],'--k',linewidth=0.5)
+        ax.plot([t_peak-2 * hpbw,t_peak+ 2 * hpbw],[peak-sll,peak-sll],'--k',linewidth=0.5)
+        ax.arrow(t_peak-2*hpbw, peak, 0, -sll , linewidth=0.5,color='black',length_includes_head=True,width=.5)
+        ax.text(t_peak-2*hpbw,peak-sll/2,f'SLL={sll:1.1f}dB',ha='right')
+    return fig,ax
+
+def plot_envelope(arr,plot_all=True,**kwargs):
+    if plot_all:    
+        return _plot(arr.theta,arr.envelopes,**kwargs)
+    else:
+        return _plot(arr.theta,arr.envelopes[:,-1 ],**kwargs)
+
+def polar_pattern(arr,**kwargs):
+    return _polar(arr.theta,db20_inplace(arr.AF),**kwargs)  
+
+def polar_envelope(arr,plot_all=True,**kwargs):
+    if plot_all:    
+        return _polar(arr.theta,arr.envelopes,**kwargs)
+    else:
+        return _polar(arr.theta,arr.envelopes[:,-1 ],**kwargs)
@@ -11,23 +11,142 @@ import numpy as np
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from scipy.signal.windows import get_window, taylor, chebwin
+from linear_array import window_vec
 
 from collections.abc import Iterable
 from collections import namedtuple
-from functools import partial
+from functools import partial, lru_cache
 import matplotlib
 from matplotlib import cm,ticker
 import mpl_toolkits
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+try:
+    # Optional GPU backend for the AF sums, enabled per array with use_gpu=True
+    import cupy
+except ImportError:
+    cupy = None
+try:
+    # Optional compiled kernel, built with: cythonize -3 -i _af_kernel.pyx
+    from _af_kernel import planar_af_kernel
+except ImportError:
+    planar_af_kernel = None
+try:
+    # Optional JIT kernel, parallel over the (phi, theta) grid; used when numba is installed
+    from _af_numba import planar_af_kernel as planar_af_kernel_jit
+except ImportError:
+    planar_af_kernel_jit = None
  
 
 PI = np.pi
 
+# Fused float64 AF kernel compiled_af(X, Y, Wr, Wi, U, V, k0) -> (AF, AFm) over the flattened
+# direction cosines U, V, with AFm the AF at -U[k0:], -V[k0:] (see _af_sum's mirror), or None
+# if neither the numba nor the Cython kernel is available
+if planar_af_kernel_jit is not None:
+    compiled_af = planar_af_kernel_jit
+elif planar_af_kernel is not None:
+    def compiled_af(X, Y, Wr, Wi, U, V, k0):
+        AF, AFm = np.empty(len(U), dtype=complex), np.empty(max(len(U) - k0, 0), dtype=complex)
+        planar_af_kernel(X, Y, Wr, Wi, U, V, k0, AF, AFm)
+        return AF, AFm
+else:
+    compiled_af = None
+
+# Directions per tile of the AF sums are chosen so one (num_elem, tile) float64 phase
+# block is about this many elements (512 KiB): the phase and trig tiles and the tile
+# of the accumulated AF then stay resident in L2 while every element row is visited
+_AF_TILE_ELEMS = 2**16
+# On the GPU the tiles only bound device memory (128 MiB float64 phase tile)
+_AF_GPU_TILE_ELEMS = 2**24
+
 def db(m,x):
     return m * np.log10(np.abs(x))
 
 db10 = partial(db,10)
 db20 = partial(db,20)
+
+def _aligned_copy(a, dtype, align=32):
+    '''C-contiguous copy of a in dtype whose data starts on an align-byte boundary'''
+    a = np.asarray(a)
+    dtype = np.dtype(dtype)
+    buf = np.empty(a.size * dtype.itemsize + align, dtype=np.uint8)
+    start = -buf.ctypes.data % align
+    out = buf[start:start + a.size * dtype.itemsize].view(dtype).reshape(a.shape)
+    out[...] = a
+    return out
+
+@lru_cache(maxsize=8)
+def _roll_index(n, shift):
+    '''Row indices taking an n-row grid to np.roll(grid, shift, axis=0), shared by every
+    array with that phi count; read-only like the cached tapers'''
+    idx = (np.arange(n) - shift) % n
+    idx.setflags(write=False)
+    return idx
+
+def _af_sum(pos, P, I, UV, dtype=np.float64, xp=np, out=None, mirror=None):
+    '''Un-normalized AF sum_e I[e]*exp(1j*(P[e] + 2*pi*pos[e] @ UV)) at every column of UV
+    pos: (N, k) element coordinates, UV: (k, Npt) matching direction cosines
+    P: element phases, either one scan (any shape of size N, giving an (Npt,) AF) or
+       one row per scan (Nscan, N), giving an (Nscan, Npt) AF
+    The geometric phase 2*pi*pos @ UV is an outer product / GEMM shared by every scan;
+    with w = I*exp(1j*P) the element sums are two real BLAS GEMMs per tile, [w.real; w.imag]
+    against its cos and its sin, into preallocated product buffers. Directions are
+    processed in cache-sized tiles (see _AF_TILE_ELEMS) through two scratch buffers reused
+    by every tile
+    dtype sets the phase / trig / GEMV precision; each tile's element sums are stored
+    into (accumulated in) a float64 AF whatever the dtype
+    xp is the array module the sums run on: numpy, or cupy to evaluate them on the GPU
+    (the inputs are copied to the device once and only the AF is copied back)
+    out: optional C-contiguous complex128 array of size Nscan*Npt the AF is written into,
+    so callers can reuse one result buffer across calls
+    mirror: optional (k0, out_m) to also get the AF at the opposite directions -UV[:,k0:]
+    in out_m (Nscan, Npt-k0). exp(1j*2*pi*pos @ -uv) is the conjugate of the tile's
+    exp(1j*2*pi*pos @ uv), so the same four GEMMs give both: with C, S the tile's cos, sin
+    AF = (wr@C - wi@S) + 1j*(wr@S + wi@C), AF_opposite = (wr@C + wi@S) + 1j*(wi@C - wr@S)'''
+    N, Npt = pos.shape[0], UV.shape[1]
+    P = np.asarray(P)
+    single = P.ndim != 2
+    W = np.ravel(I) * np.exp(1j * P.reshape(-1,N))
+    M = len(W)
+    # [wr; wi] stacked so each cos / sin tile is read by a single GEMM giving both products
+    W2, pos, UV = (xp.ascontiguousarray(xp.asarray(a), dtype=dtype) for a in (np.vstack((W.real, W.imag)), pos, UV))
+    AF = np.empty((M, Npt), dtype=complex) if out is None else out.reshape(M, Npt)
+    # tile sums go straight into the real / imag parts of the result on the CPU
+    AF_re, AF_im = (AF.real, AF.imag) if xp is np else (xp.empty((M, Npt)), xp.empty((M, Npt)))
+    k0, AFm = mirror if mirror is not None else (Npt, np.empty((M, 0), dtype=complex))
+    AFm_re, AFm_im = (AFm.real, AFm.imag) if xp is np else (xp.empty(AFm.shape), xp.empty(AFm.shape))
+    nb = min(Npt, max(64, (_AF_TILE_ELEMS if xp is np else _AF_GPU_TILE_ELEMS) // N))
+    phase_buf, trig_buf = xp.empty(N * nb, dtype=dtype), xp.empty(N * nb, dtype=dtype)
+    WC_buf, WS_buf = xp.empty(2 * M * nb, dtype=dtype), xp.empty(2 * M * nb, dtype=dtype)
+    two_pi = np.asarray(2 * PI, dtype=dtype)
+    for k in range(0, Npt, nb):
+        w = min(nb, Npt - k)
+        phase = xp.matmul(pos, UV[:,k:k+w], out=phase_buf[:N*w].reshape(N,w))
+        if ne is not None and xp is np:
+            # numexpr fuses the 2*pi scaling into threaded, block-wise trig evaluation
+            operands = {'phase': phase, 'twopi': two_pi}
+            C = ne.evaluate('cos(twopi * phase)', local_dict=operands, out=trig_buf[:N*w].reshape(N,w))
+            S = ne.evaluate('sin(twopi * phase)', local_dict=operands, out=phase)
+        else:
+            phase *= 2 * PI
+            C = xp.cos(phase, out=trig_buf[:N*w].reshape(N,w))
+            S = xp.sin(phase, out=phase)
+        WC = xp.matmul(W2, C, out=WC_buf[:2*M*w].reshape(2*M,w))
+        WS = xp.matmul(W2, S, out=WS_buf[:2*M*w].reshape(2*M,w))
+        WrC, WiC, WrS, WiS = WC[:M], WC[M:], WS[:M], WS[M:]
+        xp.subtract(WrC, WiS, out=AF_re[:,k:k+w])
+        xp.add(WrS, WiC, out=AF_im[:,k:k+w])
+        if k + w > k0:
+            j = max(k0 - k, 0)
+            xp.add(WrC[:,j:], WiS[:,j:], out=AFm_re[:,k+j-k0:k+w-k0])
+            xp.subtract(WiC[:,j:], WrS[:,j:], out=AFm_im[:,k+j-k0:k+w-k0])
+    if xp is not np:
+        AF.real, AF.imag = xp.asnumpy(AF_re), xp.asnumpy(AF_im)
+        AFm.real, AFm.imag = xp.asnumpy(AFm_re), xp.asnumpy(AFm_im)
+    return AF[0] if single else AF
     
 
 class PlanarArray():
@@ -35,7 +154,7 @@ class PlanarArray():
     
     Version = '0.1'
     
-    def __init__(self,array_shape,scan_angle=(0,0),theta=[],phi=[],element_pattern=True,window=None,SLL=None):
+    def __init__(self,array_shape,scan_angle=(0,0),theta=[],phi=[],element_pattern=True,window=None,SLL=None,dtype=np.float64,use_gpu=False):
         
         '''AF_calc calculates the Array Factor (AF) of a planar antenna array with either rect or tri grids
         
@@ -44,6 +163,10 @@ class PlanarArray():
                           be applied to array elements to scan the beam to scan angle
         theta (deg), phi(deg)  : spatial angle theta:0-180,phi=0-360 with  braodside=(0,0)
         element_pattern : Applies cosine envelope on top of the array factor
+        dtype           : float type of the AF phase/trig arithmetic; np.float32 halves the
+                          memory traffic at the cost of ~1e-3 rad phase error on large arrays
+        use_gpu         : evaluates the AF sums on the GPU with CuPy (falls back to NumPy
+                          when cupy is not installed)
         '''
 
         if array_shape[0] in ['rect','tri']:
@@ -67,13 +190,15 @@ class PlanarArray():
             self.num_elem = array_shape[1]
             self.radius = array_shape[2]
             self.array_size = sum(self.num_elem)
-            self.X = np.array([])
-            self.Y = np.array([])
+            # rings written into preallocated X / Y at their element offsets
+            offsets = np.concatenate(([0], np.cumsum(self.num_elem))).astype(int)
+            self.X = np.empty(offsets[-1])
+            self.Y = np.empty(offsets[-1])
 
             for idx, n in enumerate(self.num_elem):
-                ang = np.linspace(0,2*np.pi,n+1)
-                self.X = np.concatenate((self.X,self.radius[idx] * np.cos(ang[:-1])))
-                self.Y = np.concatenate((self.Y,self.radius[idx] * np.sin(ang[:-1])))
+                ang = np.linspace(0,2*np.pi,n,endpoint=False)
+                np.multiply(self.radius[idx], np.cos(ang), out=self.X[offsets[idx]:offsets[idx+1]])
+                np.multiply(self.radius[idx], np.sin(ang), out=self.Y[offsets[idx]:offsets[idx+1]])
 
                 
         elif array_shape[0] =='other':
@@ -92,6 +217,14 @@ class PlanarArray():
         self.window = window
         self.SLL = SLL
         self.FB_ratio = 20 # in dB
+        self._af_version = 0 # bumped by every calc_AF, invalidates the AF-derived caches (G_db)
+        self.dtype = np.dtype(dtype)
+        self.xp = cupy if use_gpu and cupy is not None else np
+        # element positions packed once for the AF sums, 32-byte aligned for SIMD loads:
+        # X / Y as float64 vectors (SoA, read by the compiled kernels) and XY as an (N, 2)
+        # array in the AF dtype (AoS, the GEMM operand of _af_sum)
+        self.X, self.Y = (_aligned_copy(np.ravel(a), np.float64) for a in (self.X, self.Y))
+        self.XY = _aligned_copy(np.stack((self.X, self.Y), axis=1), self.dtype)
         array_length = np.sqrt((np.max(self.X) - np.min(self.X))**2 + (np.max(self.Y) - np.min(self.Y))**2)
         if not any(self.theta):
             HPBW = 51 / array_length
@@ -110,117 +243,208 @@ class PlanarArray():
     @property
     def calc_AF(self):
         
+        self._set_taper()
+        self._set_scan_phase()
         if self.shape == 'rect':
- 
-            
-            self.row_ = np.reshape(self.row,(-1,1,1))   
-            self.col_ = np.reshape(self.col,(-1,1,1))        
-    
-    
-            self.Pcol = -2 * PI * self.col_ * np.sin(np.radians(self.scan_angle[0])) * np.cos(np.radians(self.scan_angle[1])) 
-            self.Prow = -2 * PI * self.row_ * np.sin(np.radians(self.scan_angle[0])) * np.sin(np.radians(self.scan_angle[1])) 
-            
-            self.Icol = np.ones(self.col_.shape)
-            self.Irow = np.ones(self.row_.shape)
-    
-            if self.window:
-                self.Icol = get_window(self.window, self.num_elem[1]).reshape(self.col_.shape)
-                self.Irow = get_window(self.window, self.num_elem[0]).reshape(self.row_.shape)
-            if self.SLL:
-                if self.SLL < 50:
-                    self.Icol = taylor(self.num_elem[1], nbar=5, sll=self.SLL).reshape(self.col_.shape)
-                    self.Irow = taylor(self.num_elem[0], nbar=5, sll=self.SLL).reshape(self.row_.shape)
-                else:
-                    self.Icol = chebwin(self.num_elem[1], self.SLL).reshape(self.col_.shape)
-                    self.Irow = chebwin(self.num_elem[0], self.SLL).reshape(self.row_.shape)
-            
-     
             self.AF = self.calc_AF_rect()     
         else:
             self.AF = self.calc_AF_()
+        self._af_version += 1
            
         return self.AF  
         
+    def _set_taper(self):
+        '''Element excitations: separable row / column tapers for rect, uniform otherwise'''
+        if self.shape == 'rect':
+            window = tuple(self.window) if isinstance(self.window, list) else self.window
+            self.Icol = window_vec(self.num_elem[1], window, self.SLL).reshape(-1,1,1)
+            self.Irow = window_vec(self.num_elem[0], window, self.SLL).reshape(-1,1,1)
+        else:
+            self.I = np.ones(len(self.X))
 
+    def _set_scan_phase(self):
+        '''Progressive element phases steering the beam to scan_angle: column / row phases
+        Pcol / Prow for rect, per-element P = Px + Py otherwise'''
+        st = np.sin(np.radians(self.scan_angle[0]))
+        cos_phi_scan, sin_phi_scan = np.cos(np.radians(self.scan_angle[1])), np.sin(np.radians(self.scan_angle[1]))
+        if self.shape == 'rect':
+            self.row_ = np.reshape(self.row,(-1,1,1))   
+            self.col_ = np.reshape(self.col,(-1,1,1))        
+            self.Pcol = -2 * PI * self.col_ * st * cos_phi_scan
+            self.Prow = -2 * PI * self.row_ * st * sin_phi_scan
+        else:
+            self.Px = -2 * PI * self.X * st * cos_phi_scan
+            self.Py = -2 * PI * self.Y * st * sin_phi_scan
+            self.P = self.Px + self.Py
 
     def calc_AF_rect(self):
-        theta = self.theta.reshape(1,-1)
-        phi = self.phi.reshape(-1,1)
-        CPST = np.matmul(np.cos(phi * PI/180),np.sin(theta * PI/180))
-        SPST = np.matmul(np.sin(phi * PI/180),np.sin(theta * PI/180))
-
-        AFcol = np.zeros(CPST.shape, dtype=complex)
-
-        for i in range(len(self.col)):
-            AFcol += self.Icol[i] * np.exp(1j * self.Pcol[i] + 1j * 2 * np.pi * self.col[i] * CPST)
-        AFrow = np.zeros(SPST.shape, dtype=complex)
-        for i in range(len(self.row)):
-            AFrow += self.Irow[i] * np.exp(1j * self.Prow[i] + 1j * 2 * np.pi * self.row[i] * SPST)
-        
-        # AFcol = np.sum(self.Icol * np.exp(1j * self.Pcol + 1j * 2 * np.pi * np.tensordot(self.col,CPST,axes = 0)),axis=0)
-        # AFrow = np.sum(self.Irow * np.exp(1j * self.Prow + 1j * 2 * np.pi * np.tensordot(self.row,SPST,axes = 0)),axis=0)
-
-        # chunk_size = 50
-        # AFcol = np.zeros(CPST.shape, dtype=complex)
-        # for i in range(0, len(self.col), chunk_size):
-        #     end = min(i + chunk_size, len(self.col))
-        #     chunk = np.tensordot(self.col[i:end], CPST, axes=0)
-        #     AFcol += np.sum(self.Icol[i:end] * np.exp(1j * self.Pcol[i:end] + 1j * 2 * np.pi * chunk), axis=0)
-        # AFrow = np.zeros(SPST.shape, dtype=complex)
-        # for i in range(0, len(self.row), chunk_size):
-        #     end = min(i + chunk_size, len(self.row))
-        #     chunk = np.tensordot(self.row[i:end], SPST, axes=0)
-        #     AFrow += np.sum(self.Irow[i:end] * np.exp(1j * self.Prow[i:end] + 1j * 2 * np.pi * chunk), axis=0)
-        AF = AFrow * AFcol
-        T = np.tile(theta,(len(phi),1))
-        cos_theta = np.abs(np.cos(np.radians(T)) )** (0.3)
-        cos_theta[(89<=T) & (T<=91)] = np.cos(np.radians(89)) ** (0.3) * 10**(-self.FB_ratio/20)
-        cos_theta[T>91] = cos_theta[T>91] * 10**(-self.FB_ratio/20)
-        
-        if self.element_pattern:
-            AF = AF * cos_theta
+        '''Normalized (Nphi, Ntheta) AF of a rect array at the current scan'''
+        return self._normalize_AF(self._AF_rect(self.phi, self.Pcol, self.Prow))
 
+    def calc_AF_ (self):
+        '''Normalized (Nphi, Ntheta) AF of an arbitrary-geometry array at the current scan'''
+        self._set_scan_phase()
+        return self._normalize_AF(self._AF_elements(self.phi, self.P))
+
+    def calc_AF_cut(self,cut_angle):
+        '''Normalized AF (2, Ntheta) of the cut_angle (row 0) and cut_angle+180 (row 1) phi
+        planes at the current scan, without evaluating the full (Nphi, Ntheta) grid; used by
+        pattern_cut / calc_peak_sll_hpbw until calc_AF has been run'''
+        cut_angle = cut_angle % 360
+        return self._calc_AF_planes([cut_angle, (180 + cut_angle) % 360])
+
+    def _calc_AF_planes(self, phi):
+        '''Normalized AF (len(phi), Ntheta) of the given phi planes at the current scan'''
+        self._set_taper()
+        self._set_scan_phase()
+        AF = self._AF_planes(np.asarray(phi, dtype=np.float64))
+        return self._normalize_AF(AF, self._power_integral())
+
+    def _AF_planes(self, phi, *P):
+        '''Un-normalized AF (..., len(phi), Ntheta) over the given phi grid; P: the element
+        phases (Pcol, Prow for rect, P otherwise), the current scan's by default, see
+        _AF_rect / _AF_elements'''
+        if self.shape == 'rect':
+            Pcol, Prow = P or (self.Pcol, self.Prow)
+            return self._AF_rect(phi, Pcol, Prow)
+        return self._AF_elements(phi, *(P or (self.P,)))
+
+    def _AF_rect(self, phi, Pcol, Prow):
+        '''Un-normalized rect AF (len(phi), Ntheta) for the column / row phases Pcol / Prow;
+        (Nscan, num_elem) phases, one row per scan, give an (Nscan, len(phi), Ntheta) AF'''
+        sin_theta, _, cos_phi, sin_phi = self._grid_trig(phi)
+        nh = self._phi_half(phi)
+        CPST = np.outer(cos_phi[:nh], sin_theta)
+        SPST = np.outer(sin_phi[:nh], sin_theta)
+
+        # The row and column factors are 1-D sums over a uniform line of elements: a
+        # (N, Nphi*Ntheta) phase matrix reduced with BLAS GEMVs (see _af_sum), evaluated
+        # over the first nh phi rows and mirrored into the rest
+        shape = (np.shape(Pcol)[:-1] if np.ndim(Pcol) == 2 else ()) + (len(phi), len(self.theta))
+        AF = np.empty(shape, dtype=complex)
+        AFrow = np.empty(shape, dtype=complex)
+        for pos, P, I, UV, buf in ((self.col, Pcol, self.Icol, CPST, AF), (self.row, Prow, self.Irow, SPST, AFrow)):
+            _af_sum(pos.reshape(-1,1), P, I, UV.reshape(1,-1), self.dtype, self.xp, *self._split_rows(buf, nh))
+        AF *= AFrow
+        return AF
 
-        delta_theta = (self.theta[1] - self.theta[0]) * np.pi / 180
-        delta_phi= (phi[1] - phi[0]) * np.pi / 180
-            
-        AF_int =  np.sum(np.abs(AF)**2 * np.sin(np.radians(T))) * delta_theta * delta_phi / 4 / PI # integral of AF^2
-        AF = AF/ (AF_int ** 0.5)
-        
+    def _AF_elements(self, phi, P):
+        '''Un-normalized arbitrary-geometry AF (len(phi), Ntheta) for the element phases P;
+        (Nscan, num_elem) phases, one row per scan, give an (Nscan, len(phi), Ntheta) AF'''
+        sin_theta, _, cos_phi, sin_phi = self._grid_trig(phi)
+        nh = self._phi_half(phi)
+        CPST = np.outer(cos_phi[:nh], sin_theta)
+        SPST = np.outer(sin_phi[:nh], sin_theta)
+        shape = np.shape(P)[:-1] + (len(phi), len(self.theta))
+        AF = np.empty(shape, dtype=complex)
+        AF_half, (k0, AF_mirror) = self._split_rows(AF, nh)
+        if compiled_af is not None and self.dtype == np.float64 and self.xp is np:
+            X, Y, U, V = (np.ascontiguousarray(a, dtype=np.float64).ravel() for a in (self.X, self.Y, CPST, SPST))
+            W = self.I * np.exp(1j * np.reshape(P, (-1, len(X))))
+            for i, w in enumerate(W):
+                AF_half[i], AF_mirror[i] = compiled_af(X, Y, np.ascontiguousarray(w.real), np.ascontiguousarray(w.imag), U, V, k0)
+        else:
+            # single fused exponent: phase = P + 2*pi*[X Y] @ [CPST; SPST] over the flattened
+            # grid, reduced over elements with BLAS GEMVs
+            UV = np.stack((CPST.ravel(), SPST.ravel()))
+            _af_sum(self.XY, P, self.I, UV, self.dtype, self.xp, AF_half, (k0, AF_mirror))
         return AF
 
-    def calc_AF_ (self):
-        theta = self.theta.reshape(1,-1)
-        phi = self.phi.reshape(-1,1)
-        CPST = np.matmul(np.cos(phi * PI/180),np.sin(theta * PI/180))
-        SPST = np.matmul(np.sin(phi * PI/180),np.sin(theta * PI/180))
-        self.Px = -2 * PI * self.X * np.sin(np.radians(self.scan_angle[0])) * np.cos(np.radians(self.scan_angle[1])) 
-        self.Py = -2 * PI * self.Y * np.sin(np.radians(self.scan_angle[0])) * np.sin(np.radians(self.scan_angle[1])) 
-        self.P = self.Px + self.Py
-        self.I = np.ones(self.P.shape)
-        AF = np.zeros(CPST.shape, dtype=complex)
-        for n in range(self.X.shape[0]):
-            AF +=  self.I[n] * np.exp(1j * self.P[n]) * np.exp(1j * (2 * PI * self.X[n] * CPST)) * np.exp(1j * (2 * PI * self.Y[n] * SPST))
-        # XCPST = np.tensordot(self.X,np.matmul(np.cos(phi * PI/180),np.sin(theta * PI/180)),axes=0)
-        # YSPST = np.tensordot(self.Y,np.matmul(np.sin(phi * PI/180),np.sin(theta * PI/180)),axes=0)
-        # self.Px = -2 * PI * self.X * np.sin(np.radians(self.scan_angle[0])) * np.cos(np.radians(self.scan_angle[1])) 
-        # self.Py = -2 * PI * self.Y * np.sin(np.radians(self.scan_angle[0])) * np.sin(np.radians(self.scan_angle[1])) 
-        # self.P = self.Px + self.Py
-        # self.I = np.ones(self.P.shape)
-        # AF =  np.sum(self.I.reshape(-1,1,1) * np.exp(1j * self.P.reshape(-1,1,1)) * np.exp(1j * (2 * PI * XCPST)) * np.exp(1j * (2 * PI * YSPST)),axis=0)
-        T = np.tile(theta,(len(phi),1))
-        cos_theta = np.abs(np.cos(np.radians(T)) )** (0.3)
-        cos_theta[(89<=T) & (T<=91)] = np.cos(np.radians(89)) ** (0.3) * 10**(-self.FB_ratio/20)
-        cos_theta[T>91] = cos_theta[T>91] * 10**(-self.FB_ratio/20)
-        
+    def _grid_trig(self, phi=None):
+        '''sin / cos of the theta grid and cos / sin of the phi grid (self.phi by default) as
+        float64 1-D vectors, shared by the direction cosines, the element pattern and the
+        power integral'''
+        theta = np.radians(np.asarray(self.theta, dtype=np.float64))
+        phi = np.radians(np.asarray(self.phi if phi is None else phi, dtype=np.float64))
+        return np.sin(theta), np.cos(theta), np.cos(phi), np.sin(phi)
+
+    @property
+    def G_db(self):
+        '''Gain pattern 20*log10(|AF|) of the current AF, computed once per calc_AF (tracked
+        by _af_version) and shared by pattern_cut, calc_peak_sll_hpbw and the plot / plot-data
+        methods; read-only, so callers that clamp it work on copies'''
+        if self.__dict__.get('_G_db_version') != self._af_version:
+            G = db20(self.AF)
+            G.setflags(write=False)
+            self._G_db, self._G_db_version = G, self._af_version
+        return self._G_db
+
+    def _phi_half(self, phi=None):
+        '''Number of leading phi rows the AF is evaluated on. When the phi grid covers 360
+        degrees in 2h+1 rows with phi[h+i] = phi[i] + 180, the direction cosines of row h+i
+        are those of row i negated, so rows h+1..2h are mirrored from rows 1..h (see
+        _af_sum) and only h+1 rows are evaluated; otherwise all rows are'''
+        phi = np.asarray(self.phi if phi is None else phi, dtype=np.float64)
+        h = len(phi) // 2
+        if len(phi) % 2 and h and np.allclose(phi[h:], phi[:h+1] + 180, rtol=0, atol=1e-6):
+            return h + 1
+        return len(phi)
+
+    def _split_rows(self, AF, nh):
+        '''(Nscan, Nphi*Ntheta) views of AF's first nh phi rows and, as _af_sum's mirror
+        argument, of the remaining rows, which are the opposite directions of rows 1..'''
+        Nt = len(self.theta)
+        Nphi = AF.shape[-2]
+        AF = AF.reshape(-1, Nphi * Nt)
+        k0 = Nt if nh < Nphi else nh * Nt
+        return AF[:, :nh*Nt], (k0, AF[:, nh*Nt:])
+
+    def _apply_element_pattern(self, AF):
+        '''cos(theta)^0.3 element pattern with a FB_ratio back lobe, applied in place; a
+        function of theta only so it broadcasts over phi'''
         if self.element_pattern:
-            AF = AF * cos_theta
+            _, cos_theta, _, _ = self._grid_trig()
+            theta = np.asarray(self.theta, dtype=np.float64)
+            elem = np.abs(cos_theta) ** (0.3)
+            elem[(89<=theta) & (theta<=91)] = np.cos(np.radians(89)) ** (0.3) * 10**(-self.FB_ratio/20)
+            elem[theta>91] = elem[theta>91] * 10**(-self.FB_ratio/20)
+            AF *= elem
+        return AF
 
-        delta_theta = (self.theta[1] - self.theta[0]) * np.pi / 180
-        delta_phi= (phi[1] - phi[0]) * np.pi / 180
-            
-        AF_int =  np.sum(np.abs(AF)**2 * np.sin(np.radians(T))) * delta_theta * delta_phi / 4 / PI # integral of AF^2
-        AF = AF/ (AF_int ** 0.5)
+    def _power_rows(self, AF):
+        '''sum over theta of |AF|^2 sin(theta) d(theta) for every phi row of AF'''
+        sin_theta, _, _, _ = self._grid_trig()
+        theta = np.asarray(self.theta, dtype=np.float64)
+        delta_theta = (theta[1] - theta[0]) * np.pi / 180
+        # sin(theta) weighting as a mat-vec
+        AF2 = AF.real**2
+        AF2 += AF.imag**2
+        return (AF2 @ sin_theta) * delta_theta
+
+    def _power_integral(self, *P):
+        '''Radiated power integral of the current scan's AF (element pattern included), or one
+        per scan for batched phases P (see _AF_planes), equal
+        to the one _normalize_AF takes over the full (Nphi, Ntheta) grid, but over fewer phi
+        rows when the phi grid is a uniform full turn (phi[-1] = phi[0] + 360, K steps).
+        Along phi, |AF|^2 is a sum of exp(1j*z*cos(phi - a)) with z <= 2*pi*D, D the array
+        diameter, whose Fourier terms vanish (Bessel J_n(z)) for n beyond z plus a margin, so
+        the sum over the K distinct rows is K/M times the sum over any M > that bandwidth'''
+        phi = np.asarray(self.phi, dtype=np.float64)
+        delta_phi = (phi[1] - phi[0]) * np.pi / 180
+        weights = np.full(len(phi), delta_phi)
+        K = len(phi) - 1
+        if np.isclose(phi[-1] - phi[0], 360) and np.allclose(np.diff(phi), phi[1] - phi[0]):
+            z = 4 * PI * np.max(np.hypot(self.X - np.mean(self.X), self.Y - np.mean(self.Y)))
+            M = 2 * int(np.ceil((z + 12 * np.cbrt(z) + 16) / 2)) # even, so phi+180 rows mirror
+            if M < K:
+                # rows 0..M-1 stand for the K distinct rows, row M (= row 0) for row K
+                phi = np.linspace(phi[0], phi[0] + 360, M + 1)
+                weights = np.full(M + 1, 2 * np.pi / M)
+                weights[-1] = delta_phi
+        AF = self._apply_element_pattern(self._AF_planes(phi, *P))
+        return self._power_rows(AF) @ weights / 4 / PI
+
+    def _normalize_AF(self, AF, AF_int=None):
+        '''Applies the element pattern and normalizes AF (..., Nphi, Ntheta) to unit radiated
+        power, each (Nphi, Ntheta) pattern separately, in place. AF_int: the power integral
+        when AF does not cover the full phi grid (see _power_integral), one per pattern'''
+        self._apply_element_pattern(AF)
+        if AF_int is None:
+            phi = np.asarray(self.phi, dtype=np.float64)
+            delta_phi = (phi[1] - phi[0]) * np.pi / 180
+            # integral of AF^2: the theta integral of every phi row, then the sum over phi
+            AF_int = np.sum(self._power_rows(AF), axis=-1) * delta_phi / 4 / PI
+        AF /= np.asarray(AF_int)[..., None, None] ** 0.5
         
         return AF
 
@@ -245,19 +469,46 @@ class PlanarArray():
         return fig,ax
 
     def pattern_cut(self,cut_angle):
+        '''theta -180->180 and G (dB) of the cut_angle / cut_angle+180 phi planes, read from
+        the full grid once calc_AF has run, otherwise evaluated on just those two planes'''
         cut_angle = cut_angle % 360
-        G = db20(self.AF)
-        theta_cut = np.hstack((-np.flip(self.theta[1:]), self.theta))
+        if not self._af_version:
+            return self._join_cut(*db20(self.calc_AF_cut(cut_angle)))
+        G = self.G_db
         idx_phi_cut1 = np.argmin(np.abs(self.phi - cut_angle))
         idx_phi_cut2 = np.argmin(np.abs(self.phi - ((180 + cut_angle)%360)))
-        return theta_cut , np.hstack((np.flip(G[idx_phi_cut2,1:]), G[idx_phi_cut1,:]) )
+        return self._join_cut(G[idx_phi_cut1], G[idx_phi_cut2])
+
+    def _join_cut(self, G1, G2):
+        '''theta -180->180 and the cut through two opposite phi planes: G2 over theta 180->0
+        (negative theta), then G1 over theta 0->180'''
+        Nt = len(self.theta)
+        # theta axis of the cut depends only on theta: built once, read-only
+        if self.__dict__.get('_theta_cut_src') is not self.theta:
+            theta_cut = np.empty(2 * Nt - 1, dtype=np.asarray(self.theta).dtype)
+            np.negative(self.theta[:0:-1], out=theta_cut[:Nt-1])
+            theta_cut[Nt-1:] = self.theta
+            theta_cut.setflags(write=False)
+            self._theta_cut, self._theta_cut_src = theta_cut, self.theta
+        G_cut = np.empty(2 * Nt - 1, dtype=G1.dtype)
+        G_cut[:Nt-1] = G2[:0:-1]
+        G_cut[Nt-1:] = G1
+        return self._theta_cut, G_cut
         
     
     def calc_peak_sll_hpbw(self,cut_angle):
         '''Function calculates the Peak value and angle, SLL, and HPBW of G in dB
         assuming a pattern with a single peak (no grating lobes)'''
-        peak_3D = np.max(db20(np.abs(self.AF)))
-        theta_deg,G = self.pattern_cut(cut_angle)
+        if self._af_version:
+            peak_3D = np.max(self.G_db)
+            theta_deg,G = self.pattern_cut(cut_angle)
+        else:
+            # no full grid: the cut and the scan plane (where the single main beam peaks) are
+            # evaluated together, sharing one power normalization
+            cut_angle, phi_scan = cut_angle % 360, self.scan_angle[1] % 360
+            G_planes = db20(self._calc_AF_planes([cut_angle, (180 + cut_angle) % 360, phi_scan, (180 + phi_scan) % 360]))
+            peak_3D = np.max(G_planes)
+            theta_deg,G = self._join_cut(G_planes[0], G_planes[1])
         ## reducing the theta scope to -90->90 degrees
         idx_m90 = np.argmin(np.abs(theta_deg + 90))
         idx_p90 = np.argmin(np.abs(theta_deg - 90))
@@ -267,21 +518,27 @@ class PlanarArray():
         peak,idx_peak  = np.max(G), np.argmax(G) 
         theta_peak = theta_deg[idx_peak]
         dG = np.sign(np.diff(G))
-        dG_cs = -dG[0:-1] * dG[1:]# change sign in derivative (peaks & nulls)
-        dG_cs = np.insert(np.append(dG_cs,1),0,1) 
-        cs_idx = np.asarray(dG_cs == 1).nonzero()[0] # idx of peaks and nulls
-        idx_ = np.asarray(cs_idx == idx_peak).nonzero()[0][0]
-        idx_null_L, idx_null_R= cs_idx[idx_-1],cs_idx[idx_+1]
-        try:
-            idx_3dB_R = idx_peak + np.argmin(np.abs(G[idx_peak:idx_null_R] - peak + 3))
-            idx_3dB_L = idx_null_L + np.argmin(np.abs(G[idx_null_L:idx_peak] - peak + 3))
-            HPBW = theta_deg[idx_3dB_R] - theta_deg[idx_3dB_L]    
-        except:
+        cs = np.zeros(G.size, dtype=bool) # change sign in derivative (peaks & nulls)
+        cs[1:-1] = dG[:-1] * dG[1:] < 0
+        cs[[0,-1]] = True
+        cs_idx = np.flatnonzero(cs) # idx of peaks and nulls
+        idx_null_L = cs_idx[max(np.searchsorted(cs_idx, idx_peak, side='left') - 1, 0)]
+        idx_null_R = cs_idx[min(np.searchsorted(cs_idx, idx_peak, side='right'), cs_idx.size - 1)]
+
+        if idx_null_L < idx_peak < idx_null_R:
+            # -3dB points interpolated on the monotonic flanks of the main beam (floored so
+            # an exact null at -inf dB doesn't break the interpolation)
+            G_L = np.maximum(G[idx_null_L:idx_peak+1], peak - 300)
+            G_R = np.maximum(G[idx_peak:idx_null_R+1], peak - 300)
+            theta_3dB_L = np.interp(peak - 3, G_L, theta_deg[idx_null_L:idx_peak+1])
+            theta_3dB_R = np.interp(peak - 3, G_R[::-1], theta_deg[idx_peak:idx_null_R+1][::-1])
+            HPBW = theta_3dB_R - theta_3dB_L
+        else:
             HPBW = -1
-        try:
-            SLL = peak - np.max([np.max(G[0:idx_null_L]),np.max(G[idx_null_R:])])
-        except:
-            SLL = -100
+        # side lobes lie strictly outside the main-beam nulls; a side whose only sample
+        # beyond the peak is the null / edge sample itself has no lobe
+        side_lobes = np.concatenate((G[:idx_null_L], G[idx_null_R+1:]))
+        SLL = peak - side_lobes.max() if side_lobes.size else -100
         
         pattern_params = namedtuple('pattern_params',['Gain_3D','Gain','Peak_Angle','SLL','HPBW'])
         self.pattern_params = pattern_params(float(f'{peak_3D:1.1f}'), float(f'{peak:1.1f}'), float(f'{theta_peak:1.1f}'), float(f'{SLL:1.1f}'), float(f'{HPBW:1.1f}'))
@@ -374,23 +631,35 @@ class PlanarArray():
             return self._polar(self.theta,self.envelopes[:,-1 ],**kwargs)
        
     def calc_envelope(self,theta1=0,theta2=45,delta_theta=5):
+        '''Scans the beam in theta from theta1 to theta2 in the phi = scan_angle[1] plane and
+        stores the patterns of that phi cut (dB, over self.theta) in the columns of
+        self.envelopes, with their max envelope in the last column'''
         N = int((theta2 - theta1)/delta_theta)
         self.scan_range = np.linspace(theta1,theta2,N+1)
-        scan_angle_ = self.scan_angle
-        self.envelopes = np.zeros((N+1,len(self.theta)))
-        for idx,scan_angle in enumerate(self.scan_range):
-            self.scan_angle = scan_angle
-            self.envelopes[idx,:] = db20(self.calc_AF.ravel())
-        self.envelopes[N,:] = np.max(self.envelopes[:-1,:],axis=0)
-        self.envelopes = self.envelopes.T
-        self.scan_angle = scan_angle_
+        self._set_taper()
+        # element phases of all scans at once, so the geometry term is evaluated a single
+        # time for the whole sweep. The last column holds the max envelope, so the last
+        # scan angle's pattern is never needed
+        st = np.sin(np.radians(self.scan_range[:-1])).reshape(-1,1)
+        cos_phi_scan, sin_phi_scan = np.cos(np.radians(self.scan_angle[1])), np.sin(np.radians(self.scan_angle[1]))
+        if self.shape == 'rect':
+            P = (-2 * PI * self.col * st * cos_phi_scan, -2 * PI * self.row * st * sin_phi_scan)
+        else:
+            P = (-2 * PI * (self.X * cos_phi_scan + self.Y * sin_phi_scan) * st,)
+        # only the scan plane's phi row of each pattern is evaluated, (Nscan, 1, Ntheta),
+        # normalized by each scan's full-sphere power integral
+        idx_phi = np.argmin(np.abs(self.phi - self.scan_angle[1] % 360))
+        AF = self._normalize_AF(self._AF_planes(self.phi[idx_phi:idx_phi+1], *P), self._power_integral(*P))
+        self.envelopes = np.empty((len(self.theta),N+1), dtype=np.float64, order='F')
+        self.envelopes[:,:-1] = db20(AF[:,0,:]).T
+        np.max(self.envelopes[:,:-1],axis=1,out=self.envelopes[:,-1])
 
     def plot_pattern3D(self):
         pass
     
     
     def polar3D(self,**kwargs):
-        G =  20 * np.log10(np.abs(self.AF))
+        G = self.G_db
         [T,P] = np.meshgrid(self.theta,self.phi)
         max1 = max(np.max(self.X - np.mean(self.X)),np.max(self.Y - np.mean(self.Y)))
         fig, ax = self._polar3D(T,P,G,(self.X - np.mean(self.X))/max1,(self.Y-np.mean(self.Y))/max1,**kwargs)
@@ -400,7 +669,7 @@ class PlanarArray():
     
     def get_3d_polar_data(self, g_range=30):
         """Return 3D polar data for Plotly visualization"""
-        G = 20 * np.log10(np.abs(self.AF))
+        G = self.G_db
         [T, P] = np.meshgrid(self.theta, self.phi)
         
         peak = np.max(G)
@@ -494,9 +763,8 @@ class PlanarArray():
         return fig,ax;
     
     def pattern_contour(self,**kwargs):
-        G =  20 * np.log10(np.abs(self.AF))
         # phi -180->180., theta 0->180
-        GT =  np.roll(G,int(len(self.phi)/2),axis=0)        
+        GT = np.take(self.G_db, _roll_index(len(self.phi), int(len(self.phi)/2)), axis=0)
         thetaT = self.theta
         phiT = self.phi - 180
         [TT,PT] = np.meshgrid(thetaT,phiT)
@@ -505,14 +773,15 @@ class PlanarArray():
     
     def get_contour_data(self, g_range=30):
         """Return contour data for Plotly visualization"""
-        G = 20 * np.log10(np.abs(self.AF))
+        G = self.G_db
         
-        GT = np.roll(G, int(len(self.phi)/2), axis=0)
+        # phi rows rolled to -180->180 with one gather into a fresh array, then clamped in place
+        GT = np.take(G, _roll_index(len(self.phi), int(len(self.phi)/2)), axis=0)
         thetaT = self.theta
         phiT = self.phi - 180
 
-        peak = np.max(GT)
-        GT[GT < (peak - g_range)] = peak - g_range
+        peak = np.max(G)
+        np.maximum(GT, peak - g_range, out=GT)
         
         return {
             'theta': thetaT.tolist(),  # 1D vector
@@ -570,13 +839,13 @@ class PlanarArray():
         # else:
         #     ax = fig.add_axes([0, 0, 1.6, 1.2], polar=True)
 
-        G =  20 * np.log10(np.abs(self.AF))
+        G = self.G_db
         [T,P] = np.meshgrid(self.theta,self.phi)
         peak = np.max(G)
         X = np.sin(np.radians(T)) * np.cos(np.radians(P))
 
         Y = np.sin(np.radians(T)) * np.sin(np.radians(P))
-        G[G < (peak - g_range)] = peak - g_range -1
+        G = np.where(G < (peak - g_range), peak - g_range - 1, G)
 
         for p in np.array([0, 30, 60, 90, 120, 150, 180, -150, -120, -90, -60, -30]) * np.pi / 180:
             plt.plot([0, np.cos(p)],[0, np.sin(p)],'--',color=[0.5,0.5,0.5],alpha=0.5)
@@ -602,7 +871,7 @@ class PlanarArray():
     
     def get_polar_surface_data(self, g_range=30):
         """Return polar surface data for Plotly visualization"""
-        G = 20 * np.log10(np.abs(self.AF))
+        G = self.G_db
         [T, P] = np.meshgrid(self.theta, self.phi)
         peak = np.max(G)
         
@@ -610,7 +879,7 @@ class PlanarArray():
         X = np.sin(np.radians(T)) * np.cos(np.radians(P))
         Y = np.sin(np.radians(T)) * np.sin(np.radians(P))
         
-        G[G < (peak - g_range)] = peak - g_range - 1
+        G = np.where(G < (peak - g_range), peak - g_range - 1, G)
         
         return {
             'x': X.tolist(),                 # 2D matrix of x coordinates
@@ -0,0 +1,36 @@
+"""
+Request-size tests for the Flask API; run from backend/ with:  python -m unittest
+
+@author: mimfar
+"""
+
+import json
+import logging
+import unittest
+import numpy as np
+from app import app, config
+
+
+class TestApiContentLength(unittest.TestCase):
+
+    def setUp(self):
+        app.logger.setLevel(logging.ERROR)
+        self.client = app.test_client()
+
+    def test_large_circ_request_accepted(self):
+        # 400 closely spaced rings with full-precision radii: ~9KB of JSON
+        rings = 400
+        radius = np.linspace(0.25, 4, rings) + 1e-9
+        body = dict(array_type='circ', num_elem=[2] * rings, radius=radius.tolist(), scan_angle=[10, 0])
+        self.assertGreater(len(json.dumps(body)), 8 * 1024)
+        r = self.client.post('/api/planar-array/analyze', json=body)
+        self.assertEqual(r.status_code, 200)
+
+    def test_oversized_request_rejected(self):
+        body = dict(array_type='circ', num_elem=[1], radius=[0.5], pad='x' * config.API_MAX_CONTENT_LENGTH)
+        r = self.client.post('/api/planar-array/analyze', json=body)
+        self.assertEqual(r.status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
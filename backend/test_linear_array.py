@@ -0,0 +1,70 @@
+"""
+Regression tests for LinearArray; run from backend/ with:  python -m unittest
+
+@author: mimfar
+"""
+
+import unittest
+import numpy as np
+from linear_array import LinearArray
+
+
+class TestPeakSllHpbw(unittest.TestCase):
+
+    def test_hpbw_finite_when_grid_lands_on_null(self):
+        # 30 deg theta steps hit exact nulls of a 32-element array (-inf dB samples)
+        arr = LinearArray(32, 0.5, theta=np.linspace(-90, 90, 7))
+        arr.calc_AF
+        with np.errstate(divide='ignore'):
+            params = arr.calc_peak_sll_hpbw()
+        self.assertTrue(np.isfinite(params.HPBW))
+        self.assertGreater(params.HPBW, 0)
+        self.assertLessEqual(params.HPBW, 60)
+        self.assertEqual(params.Peak_Angle, 0)
+
+    def test_sll_sentinel_without_side_lobes(self):
+        # a single element's pattern is the main beam alone, with its nulls at the edges
+        arr = LinearArray(1, 0.5, theta=np.linspace(-90, 90, 181))
+        arr.calc_AF
+        with np.errstate(divide='ignore'):
+            params = arr.calc_peak_sll_hpbw()
+        self.assertEqual(params.SLL, 100)
+
+
+class TestElementPositions(unittest.TestCase):
+
+    def test_reassigned_X_rescales_scan_phase(self):
+        arr = LinearArray(8, 0.5, scan_angle=20)
+        arr.X = arr.X * 2
+        arr.calc_AF
+        ref = LinearArray(8, 1.0, scan_angle=20)
+        ref.calc_AF
+        np.testing.assert_allclose(arr.P, ref.P)
+        np.testing.assert_allclose(arr.AF, ref.AF)
+
+
+class TestEnvelope(unittest.TestCase):
+
+    def test_envelope_on_fresh_array(self):
+        arr = LinearArray(8, 0.5, theta=np.linspace(-90, 90, 181))
+        arr.calc_envelope(0, 40, 10)
+        ref = []
+        for scan in arr.scan_range[:-1]:
+            ref.append(LinearArray(8, 0.5, scan_angle=scan, theta=np.linspace(-90, 90, 181)).calc_AF)
+        with np.errstate(divide='ignore'):
+            ref = 20 * np.log10(np.abs(np.array(ref))).T
+        np.testing.assert_allclose(arr.envelopes[:, :-1], ref, atol=1e-9)
+        np.testing.assert_allclose(arr.envelopes[:, -1], ref.max(axis=1))
+
+    def test_envelope_uses_current_taper(self):
+        arr = LinearArray(16, 0.5, theta=np.linspace(-90, 90, 181))
+        arr.calc_AF
+        arr.SLL = 30
+        arr.calc_envelope(0, 20, 10)
+        ref = LinearArray(16, 0.5, theta=np.linspace(-90, 90, 181), SLL=30)
+        ref.calc_envelope(0, 20, 10)
+        np.testing.assert_allclose(arr.envelopes, ref.envelopes)
+
+
+if __name__ == '__main__':
+    unittest.main()
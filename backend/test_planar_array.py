@@ -0,0 +1,86 @@
+"""
+Regression tests for PlanarArray; run from backend/ with:  python -m unittest
+
+@author: mimfar
+"""
+
+import unittest
+import numpy as np
+from planar_array import PlanarArray, PI
+
+
+def direct_AF(arr, phi):
+    """Un-normalized AF of arr's current scan over (phi, arr.theta), summed element by
+    element with no mirroring or reduced grids"""
+    theta = np.radians(arr.theta)
+    phi = np.radians(np.asarray(phi, dtype=np.float64))
+    U = np.outer(np.cos(phi), np.sin(theta))
+    V = np.outer(np.sin(phi), np.sin(theta))
+    if arr.shape == 'rect':
+        x, y = (a.ravel() for a in np.meshgrid(arr.col, arr.row, indexing='ij'))
+        I = np.outer(arr.Icol.ravel(), arr.Irow.ravel()).ravel()
+        P = np.add.outer(arr.Pcol.ravel(), arr.Prow.ravel()).ravel()
+    else:
+        x, y, I, P = np.ravel(arr.X), np.ravel(arr.Y), arr.I, np.ravel(arr.P)
+    AF = np.zeros(U.shape, dtype=complex)
+    for xe, ye, Ie, Pe in zip(x, y, I, P):
+        AF += Ie * np.exp(1j * (Pe + 2 * PI * (xe * U + ye * V)))
+    return AF
+
+
+def full_grid_power(arr):
+    """Power integral of arr's current scan over its full (Nphi, Ntheta) grid"""
+    phi = np.asarray(arr.phi, dtype=np.float64)
+    AF = arr._apply_element_pattern(direct_AF(arr, phi))
+    return np.sum(arr._power_rows(AF)) * np.radians(phi[1] - phi[0]) / 4 / PI
+
+
+CONFIGS = (dict(array_shape=['rect', [8, 6], [0.5, 0.6]], scan_angle=[20, 30], SLL=30),
+           dict(array_shape=['circ', [8, 16], [0.5, 1.0]], scan_angle=[25, 10]))
+
+
+class TestReducedGrid(unittest.TestCase):
+    """_power_integral (reduced phi grid) and the phi+180 mirrored AF against the direct
+    full-grid sums"""
+
+    def make(self, phi=(), **cfg):
+        arr = PlanarArray(theta=np.linspace(0, 180, 181), phi=phi, **cfg)
+        arr._set_taper()
+        arr._set_scan_phase()
+        return arr
+
+    def test_mirrored_AF(self):
+        for cfg in CONFIGS:
+            arr = self.make(**cfg)
+            self.assertLess(arr._phi_half(), len(arr.phi))
+            np.testing.assert_allclose(arr._AF_planes(arr.phi), direct_AF(arr, arr.phi), rtol=0, atol=1e-10)
+
+    def test_power_integral(self):
+        for cfg in CONFIGS:
+            arr = self.make(**cfg)
+            np.testing.assert_allclose(arr._power_integral(), full_grid_power(arr), rtol=1e-12)
+
+    def test_custom_phi_grids(self):
+        # a full turn in an even number of rows (reduced power grid, no phi+180 mirror) and
+        # a half turn (neither)
+        for phi in (np.linspace(0, 360, 360), np.linspace(0, 180, 91)):
+            for cfg in CONFIGS:
+                arr = self.make(phi=phi, **cfg)
+                self.assertEqual(arr._phi_half(), len(phi))
+                np.testing.assert_allclose(arr._AF_planes(arr.phi), direct_AF(arr, arr.phi), rtol=0, atol=1e-10)
+                np.testing.assert_allclose(arr._power_integral(), full_grid_power(arr), rtol=1e-12)
+
+
+class TestPeakSllHpbw(unittest.TestCase):
+
+    def test_sll_sentinel_without_side_lobes(self):
+        # a single element's cut is the main beam alone, with its nulls at the +-90 deg edges
+        for full_grid in (True, False):
+            arr = PlanarArray(['rect', [1, 1], [0.5, 0.5]], theta=np.linspace(0, 180, 181), phi=np.linspace(0, 360, 361))
+            if full_grid:
+                arr.calc_AF
+            self.assertEqual(arr.calc_peak_sll_hpbw(0).SLL, -100)
+
+
+if __name__ == '__main__':
+    unittest.main()